@@ -7,14 +7,19 @@ This module allows users to:
 - Compute current holdings with average price
 - Display a summary of the user's portfolio with total invested, current value, gain/loss
 - Show a line chart of portfolio evolution over time
+- Live mode: refresh the holdings on an interval from a quote cache, re-valuing only the rows whose price changed
+
+The holdings and the operation form are Streamlit fragments, so interacting with one doesn't rerun the other.
 
 Data is persisted in `data/portfolio_operations.csv`.
 """
 
 import os
+import time
 import pandas as pandas
 import streamlit as streamlit
 import utils.finance_data as finance_data
+import utils.result_cache as result_cache
 import utils.tesouro_direto as tesouro_direto
 from datetime import date
 
@@ -24,6 +29,19 @@ CSV_COLUMNS = ["ticker", "operation_date", "operation_type", "investment_amount"
 OPERATIONS = ["buy", "sell", "bonus"]
 ASSET_TYPES = ["Stock", "FII", "ETF", "Crypto", "Fixed Income"]
 
+# Live mode settings
+DEFAULT_REFRESH_SECONDS = 30
+# Quotes are cached process-wide for LAST_CLOSE_TTL, so refreshing faster than that would only show stale prices
+MIN_REFRESH_SECONDS = finance_data.LAST_CLOSE_TTL
+
+# Session state keys
+HOLDINGS_STATE_KEY = "portfolio_holdings"
+QUOTE_CACHE_STATE_KEY = "portfolio_quote_cache"
+VALUATION_STATE_KEY = "portfolio_valuation"
+
+# Holding columns a cached quote depends on
+QUOTE_INPUT_COLUMNS = ["quantity", "investment_amount", "operation_date"]
+
 def load_operations():
     if not os.path.exists(OPERATIONS_PATH):
         pandas.DataFrame(columns=CSV_COLUMNS).to_csv(OPERATIONS_PATH, index=False)
@@ -56,6 +74,13 @@ def save_operation(ticker, operation_date, operation_type, investment_amount, qu
     operations = pandas.concat([operations, new_operation], ignore_index=True)
     operations.to_csv(OPERATIONS_PATH, index=False)
 
+    # Drops the cached quotes and bond valuations, so the new holdings are valued with fresh prices
+    result_cache.invalidate(
+        finance_data.get_last_close,
+        tesouro_direto.get_last_price,
+        tesouro_direto.get_bond_returns
+    )
+
 def compute_portfolio(operations):
     if operations.empty or "ticker" not in operations.columns:
         return pandas.DataFrame(columns=CSV_COLUMNS)
@@ -116,82 +141,162 @@ def get_last_price(row):
     else:
         return finance_data.get_last_close(row["ticker"])
 
-def show():
-    streamlit.header("Portfolio Tracker")
-    
-    # Loads the portfolio from the file
+def get_holdings():
+    """Returns the current holdings, recomputed only when the operations file changes."""
+    cached = streamlit.session_state.get(HOLDINGS_STATE_KEY)
+    if cached is not None and os.path.exists(OPERATIONS_PATH) and cached["mtime"] == os.path.getmtime(OPERATIONS_PATH):
+        return cached["holdings"]
+
     operations = load_operations()
-    portfolio_df = compute_portfolio(operations)
+    operations_mtime = os.path.getmtime(OPERATIONS_PATH)
+    holdings = compute_portfolio(operations)
+    prune_quotes(cached["holdings"] if cached is not None else None, holdings)
+    streamlit.session_state[HOLDINGS_STATE_KEY] = {"mtime": operations_mtime, "holdings": holdings}
 
-    if portfolio_df.empty:
-        streamlit.info("No holdings yet.")
-        
-    else:
-        display_df = portfolio_df.copy()
+    # Drops the previous valuation, as the rows it was built on may no longer exist
+    streamlit.session_state.pop(VALUATION_STATE_KEY, None)
+    return holdings
+
+def prune_quotes(previous_holdings, holdings):
+    """
+    Drops the cached quotes of holdings that changed or are no longer held.
+    Fixed Income prices depend on the quantity, amount and date of the position, not only on the ticker.
+    """
+    quote_cache = streamlit.session_state.get(QUOTE_CACHE_STATE_KEY)
+    if not quote_cache:
+        return
+
+    if previous_holdings is None or previous_holdings.empty or holdings.empty:
+        quote_cache.clear()
+        return
+
+    previous = previous_holdings.set_index("original_ticker")[QUOTE_INPUT_COLUMNS]
+    current = holdings.set_index("original_ticker")[QUOTE_INPUT_COLUMNS]
+
+    for key in list(quote_cache):
+        if key not in current.index or key not in previous.index or not current.loc[key].equals(previous.loc[key]):
+            del quote_cache[key]
+
+def refresh_quotes(portfolio_df, max_age_seconds):
+    """
+    Refreshes the quote cache for the holdings whose quote is older than max_age_seconds.
+    Returns the set of original tickers whose price changed.
+    """
+    quote_cache = streamlit.session_state.setdefault(QUOTE_CACHE_STATE_KEY, {})
+    now = time.monotonic()
+    changed = set()
+
+    for _, row in portfolio_df.iterrows():
+        key = row["original_ticker"]
+        cached = quote_cache.get(key)
+
+        if cached is not None and now - cached["fetched_at"] < max_age_seconds:
+            continue
+
+        last_price = get_last_price(row)
+        quote_cache[key] = {"price": last_price, "fetched_at": now}
+
+        if cached is None or cached["price"] != last_price:
+            changed.add(key)
+
+    return changed
+
+def value_holdings(portfolio_df, changed_tickers):
+    """Returns the holdings valuation, recomputing only the rows whose price changed since the last call."""
+    quote_cache = streamlit.session_state.get(QUOTE_CACHE_STATE_KEY, {})
+    valuation_df = streamlit.session_state.get(VALUATION_STATE_KEY)
+
+    if valuation_df is None:
+        valuation_df = portfolio_df.copy()
 
         # Calculating investment amount differently based on asset_type
         # This iterates the dataframe and returns investment_amount if asset_type is fixed, calculates it if not.
-        display_df["investment_amount"] = display_df.apply(
+        valuation_df["investment_amount"] = valuation_df.apply(
             lambda row: row["investment_amount"] if row["asset_type"] == "Fixed Income"
             else row["quantity"] * row["avg_price"],
             axis=1
         )
+        stale_rows = pandas.Series(True, index=valuation_df.index)
 
-        display_df["last_price"] = display_df.apply(get_last_price, axis=1)
-        display_df["current_value"] = display_df["quantity"] * display_df["last_price"]
-        display_df["gain_loss_pct"] = (display_df["current_value"] - display_df["investment_amount"]) / display_df["investment_amount"] * 100
+    else:
+        stale_rows = valuation_df["original_ticker"].isin(changed_tickers)
 
-        # Calculating data for the portfolio Summary
-        num_stocks = len(display_df)
-        total_qty = display_df["quantity"].sum()
-        total_invested = display_df["investment_amount"].sum()
-        total_current = display_df["current_value"].sum()
-        total_return_pct = 0
-        
-        if total_invested > 0:
-            total_return_pct = (total_current - total_invested) / total_invested * 100
-
-        # Portfolio summary
-        col1, col2, col3 = streamlit.columns(3)
-        col1.metric("💵 Current Value", f"R$ {total_current:,.2f}", delta=f"{total_return_pct:.2f}%")
-        col2.metric("🏢 Tickers", f"{num_stocks}")
-        col3.metric("📦 Stocks Held", f"{int(total_qty)}")
-        
-        # Format for display
-        display_df["quantity"] = display_df["quantity"].apply(lambda x: f"{x:,.2f}")
-        display_df["avg_price"] = display_df["avg_price"].apply(lambda x: f"R$ {x:,.2f}")
-        display_df["last_price"] = display_df["last_price"].apply(lambda x: f"R$ {x:,.2f}" if x else "N/A")
-        display_df["investment_amount"] = display_df["investment_amount"].apply(lambda x: f"R$ {x:,.2f}")
-        display_df["current_value"] = display_df["current_value"].apply(lambda x: f"R$ {x:,.2f}")
-        display_df["gain_loss_pct"] = display_df["gain_loss_pct"].apply(lambda x: f"{x:.2f}%")
-
-        # Reorder columns before renaming
-        display_df = display_df[[
-            "asset_type",
-            "ticker",
-            "ticker_shortname",
-            "quantity",
-            "avg_price",
-            "last_price",
-            "investment_amount",
-            "current_value",
-            "gain_loss_pct"
-        ]]
-
-        # Renaming the columns
-        streamlit.dataframe(display_df.rename(columns={
-            "asset_type": "Type",
-            "ticker": "Ticker",
-            "ticker_shortname": "Name",
-            "quantity": "Quantity",
-            "avg_price": "Avg Price",
-            "last_price": "Last Price",
-            "investment_amount": "Invested $",
-            "current_value": "Current $",
-            "gain_loss_pct": "Gain/Loss"
-        }), use_container_width=True)
-
-    # Add Operation Form
+    if stale_rows.any():
+        stale_df = valuation_df.loc[stale_rows]
+        last_price = stale_df["original_ticker"].map(lambda key: quote_cache[key]["price"]).astype(float)
+        current_value = stale_df["quantity"] * last_price
+
+        valuation_df.loc[stale_rows, "last_price"] = last_price
+        valuation_df.loc[stale_rows, "current_value"] = current_value
+        valuation_df.loc[stale_rows, "gain_loss_pct"] = (current_value - stale_df["investment_amount"]) / stale_df["investment_amount"] * 100
+
+    streamlit.session_state[VALUATION_STATE_KEY] = valuation_df
+    return valuation_df
+
+def show_holdings(refresh_seconds):
+    """Renders the portfolio summary and holdings table from the quote cache."""
+    portfolio_df = get_holdings()
+
+    if portfolio_df.empty:
+        streamlit.info("No holdings yet.")
+        return
+
+    changed_tickers = refresh_quotes(portfolio_df, refresh_seconds)
+    display_df = value_holdings(portfolio_df, changed_tickers).copy()
+
+    # Calculating data for the portfolio Summary
+    num_stocks = len(display_df)
+    total_qty = display_df["quantity"].sum()
+    total_invested = display_df["investment_amount"].sum()
+    total_current = display_df["current_value"].sum()
+    total_return_pct = 0
+    
+    if total_invested > 0:
+        total_return_pct = (total_current - total_invested) / total_invested * 100
+
+    # Portfolio summary
+    col1, col2, col3 = streamlit.columns(3)
+    col1.metric("💵 Current Value", f"R$ {total_current:,.2f}", delta=f"{total_return_pct:.2f}%")
+    col2.metric("🏢 Tickers", f"{num_stocks}")
+    col3.metric("📦 Stocks Held", f"{int(total_qty)}")
+    
+    # Format for display
+    display_df["quantity"] = display_df["quantity"].apply(lambda x: f"{x:,.2f}")
+    display_df["avg_price"] = display_df["avg_price"].apply(lambda x: f"R$ {x:,.2f}")
+    display_df["last_price"] = display_df["last_price"].apply(lambda x: f"R$ {x:,.2f}" if pandas.notna(x) else "N/A")
+    display_df["investment_amount"] = display_df["investment_amount"].apply(lambda x: f"R$ {x:,.2f}")
+    display_df["current_value"] = display_df["current_value"].apply(lambda x: f"R$ {x:,.2f}")
+    display_df["gain_loss_pct"] = display_df["gain_loss_pct"].apply(lambda x: f"{x:.2f}%")
+
+    # Reorder columns before renaming
+    display_df = display_df[[
+        "asset_type",
+        "ticker",
+        "ticker_shortname",
+        "quantity",
+        "avg_price",
+        "last_price",
+        "investment_amount",
+        "current_value",
+        "gain_loss_pct"
+    ]]
+
+    # Renaming the columns
+    streamlit.dataframe(display_df.rename(columns={
+        "asset_type": "Type",
+        "ticker": "Ticker",
+        "ticker_shortname": "Name",
+        "quantity": "Quantity",
+        "avg_price": "Avg Price",
+        "last_price": "Last Price",
+        "investment_amount": "Invested $",
+        "current_value": "Current $",
+        "gain_loss_pct": "Gain/Loss"
+    }), use_container_width=True)
+
+@streamlit.fragment
+def show_operation_form():
+    """Renders the Add New Operation form. Being a fragment, interacting with it never reruns the valuation."""
     streamlit.subheader("Add New Operation")
 
     with streamlit.form("add_operation_form", clear_on_submit=True):
@@ -205,9 +310,10 @@ def show():
 
     if submit:
         form_error = False
+        portfolio_df = get_holdings()
 
         # Prevent invalid sells
-        current_qty = portfolio_df[portfolio_df["ticker"] == ticker.upper()]["quantity"].sum()
+        current_qty = portfolio_df[portfolio_df["ticker"] == ticker.upper()]["quantity"].sum() if not portfolio_df.empty else 0
         if operation_type == "sell" and quantity > current_qty:
             streamlit.error(f"Cannot sell {quantity} shares. You only hold {current_qty}.")
             form_error = True
@@ -233,4 +339,24 @@ def show():
         if not form_error:
             save_operation(ticker.upper(), operation_date, operation_type, investment_amount, quantity, asset_type)
             streamlit.success(f"{operation_type.capitalize()} recorded for {ticker}.")
-            streamlit.rerun()
\ No newline at end of file
+
+            # Full rerun, so the holdings fragment picks up the new operation
+            streamlit.rerun(scope="app")
+
+def show():
+    streamlit.header("Portfolio Tracker")
+
+    # Live mode refreshes the holdings on an interval, without rerunning the rest of the page
+    col1, col2 = streamlit.columns(2)
+    live_mode = col1.toggle("🔴 Live mode", value=False)
+    refresh_seconds = col2.number_input(
+        "Refresh interval (seconds)", 
+        min_value=MIN_REFRESH_SECONDS, 
+        value=DEFAULT_REFRESH_SECONDS, 
+        step=5
+    )
+
+    holdings_fragment = streamlit.fragment(show_holdings, run_every=refresh_seconds if live_mode else None)
+    holdings_fragment(refresh_seconds)
+
+    show_operation_form()
@@ -0,0 +1,4 @@
+import sys, os
+
+# The app imports its modules relative to the code/ folder (e.g. `import utils.finance_data`)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,111 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import utils.price_matrix as price_matrix
+
+@pytest.fixture(autouse=True)
+def matrix_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(price_matrix, "MATRIX_DIR", str(tmp_path))
+    monkeypatch.setattr(price_matrix, "_mapped", {})
+    return tmp_path
+
+def make_prices(column, start="2024-01-01", periods=5):
+    index = pd.date_range(start, periods=periods, tz="America/Sao_Paulo")
+    return pd.DataFrame({column: np.arange(periods, dtype=float)}, index=index)
+
+def test_read_back_covered_range():
+    price_matrix.write_columns("close", make_prices("A"), "2024-01-01", "2024-01-06")
+
+    prices = price_matrix.read_columns("close", ["A"], "2024-01-02", "2024-01-05")
+    assert prices["A"].tolist() == [1.0, 2.0, 3.0]
+
+def test_uncovered_range_misses():
+    price_matrix.write_columns("close", make_prices("A"), "2024-01-01", "2024-01-06")
+
+    assert price_matrix.read_columns("close", ["A"], "2023-12-01", "2024-01-05") is None
+    assert price_matrix.read_columns("close", ["B"], "2024-01-02", "2024-01-05") is None
+
+def test_frame_is_mapped_read_only():
+    price_matrix.write_columns("close", make_prices("A"))
+    _, frame = price_matrix.load_matrix("close")
+
+    values = frame._mgr.blocks[0].values
+    while values.base is not None and not isinstance(values, np.memmap):
+        values = values.base
+
+    assert isinstance(values, np.memmap)
+    assert not values.flags.writeable
+
+def test_freshness_is_per_column(monkeypatch):
+    price_matrix.write_columns("pu", make_prices("OLD"))
+
+    # Writing another column later must not make the old one look fresh
+    now = price_matrix.time.time()
+    monkeypatch.setattr(price_matrix.time, "time", lambda: now + 3600)
+    price_matrix.write_columns("pu", make_prices("NEW"))
+
+    assert price_matrix.read_columns("pu", ["OLD"], max_age_seconds=60) is None
+    assert price_matrix.read_columns("pu", ["NEW"], max_age_seconds=60) is not None
+
+def test_coverage_stops_at_last_completed_session(monkeypatch):
+    monkeypatch.setattr(price_matrix, "last_session_end", lambda: pd.Timestamp("2024-01-04"))
+    price_matrix.write_columns("close", make_prices("A"), "2024-01-01", "2024-01-06")
+
+    assert price_matrix.read_columns("close", ["A"], "2024-01-01", "2024-01-04") is not None
+    assert price_matrix.read_columns("close", ["A"], "2024-01-01", "2024-01-05") is None
+
+def test_concurrent_writes_keep_every_column(matrix_dir):
+    errors = []
+
+    def write(column):
+        try:
+            price_matrix.write_columns("close", make_prices(column))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(f"T{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    _, frame = price_matrix.load_matrix("close")
+    assert sorted(frame.columns) == sorted(f"T{i}" for i in range(8))
+
+    # Only the current data file and header are left
+    files = sorted(file_name for file_name in os.listdir(matrix_dir) if file_name != price_matrix.LOCK_FILE)
+    assert len(files) == 2
+
+def test_publish_never_raises(monkeypatch):
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(price_matrix, "write_columns", fail)
+    price_matrix.publish("close", make_prices("A"))
+
+def test_any_process_publishes(monkeypatch):
+    monkeypatch.delenv("PRICE_MATRIX_READ_ONLY", raising=False)
+    price_matrix.publish("close", make_prices("A"))
+
+    assert price_matrix.read_columns("close", ["A"]) is not None
+
+def test_read_only_processes_dont_publish(monkeypatch):
+    monkeypatch.setenv("PRICE_MATRIX_READ_ONLY", "1")
+    price_matrix.publish("close", make_prices("A"))
+
+    assert price_matrix.load_matrix("close") == (None, None)
+
+def test_timezone_is_restored():
+    written = make_prices("A")
+    price_matrix.write_columns("close", written)
+
+    prices = price_matrix.read_columns("close", ["A"])
+    assert str(prices.index.tz) == "America/Sao_Paulo"
+    assert prices.index.equals(written.index.rename("Date"))
+
+def test_ticker_column_is_normalized():
+    assert price_matrix.ticker_column(" petr4.sa") == price_matrix.ticker_column("PETR4.SA") == "PETR4.SA"
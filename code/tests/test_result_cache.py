@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+import utils.result_cache as result_cache
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    result_cache.invalidate()
+    yield
+    result_cache.invalidate()
+
+def make_counter(ttl=60, size=8):
+    calls = []
+
+    @result_cache.cached(ttl=ttl, normalize={"ticker": result_cache.normalize_text, "day": result_cache.normalize_date})
+    def fetch(ticker, day=None):
+        calls.append(ticker)
+        return np.zeros(size // 8)
+
+    return fetch, calls
+
+def test_normalized_arguments_share_an_entry():
+    fetch, calls = make_counter()
+
+    fetch("petr4.sa", "2024-01-01")
+    fetch(" PETR4.SA", pd.Timestamp("2024-01-01"))
+    assert len(calls) == 1
+
+def test_results_are_copies():
+    fetch, _ = make_counter()
+
+    fetch("A")[:] = 1
+    assert (fetch("A") == 0).all()
+
+def test_ttl_expires(monkeypatch):
+    fetch, calls = make_counter(ttl=5)
+    now = result_cache.time.monotonic()
+
+    fetch("A")
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now + 10)
+    fetch("A")
+    assert len(calls) == 2
+
+def test_lru_eviction_by_bytes(monkeypatch):
+    monkeypatch.setattr(result_cache, "MAX_CACHE_BYTES", 2000)
+    fetch, calls = make_counter(size=1000)
+
+    fetch("A")
+    fetch("B")
+    fetch("A")
+    fetch("C")
+
+    # B was the least recently used
+    fetch("A")
+    fetch("B")
+    assert calls == ["A", "B", "C", "B"]
+    assert result_cache.stats()["bytes"] <= 2000
+
+def test_invalidate_function():
+    fetch, calls = make_counter()
+    other_calls = []
+
+    @result_cache.cached(ttl=60)
+    def other(ticker):
+        other_calls.append(ticker)
+        return 0.0
+
+    fetch("A")
+    other("A")
+    fetch.invalidate()
+    fetch("A")
+    other("A")
+
+    assert len(calls) == 2
+    assert len(other_calls) == 1
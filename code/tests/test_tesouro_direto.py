@@ -0,0 +1,132 @@
+import io
+from datetime import date
+import numpy as np
+import pandas as pd
+import pytest
+import utils.price_matrix as price_matrix
+import utils.result_cache as result_cache
+import utils.tesouro_direto as tesouro_direto
+import utils.tesouro_pricing as tesouro_pricing
+
+# Same layout as PrecoTaxaTesouroDireto.csv. Bonds no longer offered have blank or zero buy-side fields.
+PRICE_TABLE = """Tipo Titulo;Data Vencimento;Data Base;Taxa Compra Manha;Taxa Venda Manha;PU Compra Manha;PU Venda Manha;PU Base Manha
+Tesouro Prefixado;01/01/2031;03/12/2024;13,40;13,52;470,00;466,00;466,00
+Tesouro Prefixado;01/01/2031;04/12/2024;13,43;13,55;469,00;465,50;465,50
+Tesouro Prefixado com Juros Semestrais;01/01/2035;04/12/2024;13,40;13,52;860,00;855,00;855,00
+Tesouro IPCA+ com Juros Semestrais;15/05/2035;04/12/2024;6,80;6,92;4300,00;4280,00;4280,00
+Tesouro IPCA+;15/05/2029;04/12/2024;0,00;6,90;0,00;3400,00;3400,00
+Tesouro Selic;01/03/2027;04/12/2024;;0,05;;15500,00;15500,00
+Tesouro Selic;01/03/2027;05/12/2024;0,00;0,00;0,00;0,00;0,00
+Tesouro Selic;01/03/2029;03/12/2024;0,10;0,12;15000,00;14990,00;14990,00
+Tesouro Selic;01/03/2029;04/12/2024;0,10;0,12;15006,00;14996,00;14996,00
+"""
+
+@pytest.fixture
+def bonds(monkeypatch, tmp_path):
+    dataframe = tesouro_direto.parse_date_columns(pd.read_csv(io.StringIO(PRICE_TABLE), sep=";", decimal=","))
+    dataframe = dataframe.set_index(pd.MultiIndex.from_frame(dataframe.iloc[:, :2])).iloc[:, 2:]
+
+    monkeypatch.setattr(tesouro_direto, "get_bonds", lambda type="venda", group=True: dataframe)
+    monkeypatch.setattr(price_matrix, "MATRIX_DIR", str(tmp_path))
+    result_cache.invalidate()
+    yield dataframe
+    result_cache.invalidate()
+
+@pytest.mark.parametrize("bond_name, maturity_date", [
+    ("TESOURO PREFIXADO COM JUROS SEMESTRAIS", "2035-01-01"),
+    ("TESOURO IPCA+ COM JUROS SEMESTRAIS", "2035-05-15"),
+    ("TESOURO IPCA+", "2029-05-15"),
+    ("tesouro selic", "2027-03-01"),
+])
+def test_select_bond_ignores_case(bonds, bond_name, maturity_date):
+    assert not tesouro_direto.select_bond(bonds, bond_name, maturity_date).empty
+
+def test_select_bond_not_found(bonds):
+    with pytest.raises(KeyError):
+        tesouro_direto.select_bond(bonds, "TESOURO PREFIXADO", "2099-01-01")
+
+def test_bond_prices_match_the_published_sell_side(bonds):
+    prices = tesouro_direto.get_bond_prices(
+        ["TESOURO IPCA+ COM JUROS SEMESTRAIS", "TESOURO IPCA+", "TESOURO SELIC"],
+        ["2035-05-15", "2029-05-15", "2027-03-01"],
+        "2024-12-04",
+        bonds=bonds
+    )
+    assert prices == pytest.approx([4280.0, 3400.0, 15500.0], abs=1e-5)
+
+def test_bond_prices_skip_rows_without_prices(bonds):
+    # The 05/12 row has no prices, so the 04/12 publication is used (accrued by a day)
+    price = tesouro_direto.get_bond_prices("TESOURO SELIC", "2027-03-01", "2024-12-05", bonds=bonds)
+    assert price == pytest.approx(15500.0, rel=1e-5)
+
+def test_bond_prices_before_first_publication(bonds):
+    price = tesouro_direto.get_bond_prices("TESOURO PREFIXADO", "2031-01-01", "2024-12-01", bonds=bonds)
+    assert np.isnan(price)
+
+def test_last_price_after_last_publication(bonds):
+    published = tesouro_direto.get_last_price("TESOURO PREFIXADO", "2031-01-01", "2024-12-03", 2, 932.0, "2024-12-04")
+    later = tesouro_direto.get_last_price("TESOURO PREFIXADO", "2031-01-01", "2024-12-03", 2, 932.0, "2024-12-10")
+
+    expected_growth = (
+        tesouro_pricing.price_bonds("LTN", "2031-01-01", 0.1355, "2024-12-10")
+        / tesouro_pricing.price_bonds("LTN", "2031-01-01", 0.1355, "2024-12-04")
+    )
+    assert published == pytest.approx(932.0 * 465.5 / 466.0 / 2)
+    assert later == pytest.approx(published * expected_growth)
+
+def test_bond_series_are_published_and_read_from_the_matrix(bonds, monkeypatch):
+    monkeypatch.delenv("PRICE_MATRIX_READ_ONLY", raising=False)
+    downloaded = tesouro_direto.get_bond_series("TESOURO PREFIXADO", "2031-01-01")
+
+    def no_download(*args, **kwargs):
+        raise AssertionError("the table shouldn't be downloaded again")
+
+    monkeypatch.setattr(tesouro_direto, "get_bonds", no_download)
+    from_matrix = tesouro_direto.get_bond_series("tesouro prefixado", "2031-01-01")
+
+    assert from_matrix.to_numpy() == pytest.approx(downloaded.to_numpy())
+
+def test_last_price_bought_after_last_publication(bonds):
+    # Bought on a Saturday, after the 04/12 publication, and valued on Monday
+    price = tesouro_direto.get_last_price("TESOURO PREFIXADO", "2031-01-01", "2024-12-07", 2, 932.0, "2024-12-09")
+
+    expected_growth = (
+        tesouro_pricing.price_bonds("LTN", "2031-01-01", 0.1355, "2024-12-09")
+        / tesouro_pricing.price_bonds("LTN", "2031-01-01", 0.1355, "2024-12-07")
+    )
+    assert price == pytest.approx(932.0 * expected_growth / 2)
+
+def test_indexed_vna_accrues_after_last_publication(bonds):
+    published = tesouro_direto.get_bond_prices("TESOURO SELIC", "2029-03-01", "2024-12-04", bonds=bonds)
+    later = tesouro_direto.get_bond_prices("TESOURO SELIC", "2029-03-01", "2024-12-09", bonds=bonds)
+
+    vna = tesouro_pricing.implied_vna("LFT", ["2029-03-01"] * 2, 0.0012, ["2024-12-03", "2024-12-04"], [14990.0, 14996.0])
+    daily_factor = vna[1] / vna[0]
+    du = tesouro_pricing.business_days("2024-12-04", "2024-12-09")
+    expected = tesouro_pricing.price_bonds("LFT", "2029-03-01", 0.0012, "2024-12-09", vna=vna[1] * daily_factor ** du)
+
+    assert published == pytest.approx(14996.0, abs=1e-5)
+    assert later == pytest.approx(expected, abs=1e-5)
+    assert later > published * daily_factor ** (du - 1)
+
+def test_fallback_downloads_are_cached(monkeypatch, tmp_path):
+    downloads = []
+
+    def fake_get(url):
+        downloads.append(url)
+        return type("Response", (), {"text": PRICE_TABLE})()
+
+    monkeypatch.setattr(tesouro_direto.requests, "get", fake_get)
+    monkeypatch.setattr(price_matrix, "MATRIX_DIR", str(tmp_path))
+    monkeypatch.setenv("PRICE_MATRIX_READ_ONLY", "1")
+    result_cache.invalidate()
+
+    for _ in range(3):
+        tesouro_direto.get_bond_prices(["TESOURO PREFIXADO"], ["2031-01-01"], ["2024-12-04"])
+
+    result_cache.invalidate()
+    assert len(downloads) == 1
+
+def test_default_valuation_date_is_keyed_as_today():
+    assert tesouro_direto.normalize_valuation_date(None) == date.today().isoformat()
+    assert tesouro_direto.normalize_valuation_date("2024-12-09") == "2024-12-09"
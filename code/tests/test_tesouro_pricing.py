@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+import utils.tesouro_pricing as tesouro_pricing
+
+# Weekdays in the year minus the national holidays falling on weekdays
+@pytest.mark.parametrize("year, expected", [(2023, 249), (2024, 253)])
+def test_business_days_in_year(year, expected):
+    assert tesouro_pricing.business_days(f"{year}-01-01", f"{year + 1}-01-01") == expected
+
+def test_easter_based_holidays():
+    holidays = tesouro_pricing.get_holidays(2025, 2025)
+
+    assert tesouro_pricing.easter_date(2024) == np.datetime64("2024-03-31")
+    for day in ["2025-03-03", "2025-03-04", "2025-04-18", "2025-06-19"]:
+        assert np.datetime64(day) in holidays
+
+def test_black_consciousness_day_starts_in_2024():
+    assert np.datetime64("2023-11-20") not in tesouro_pricing.get_holidays(2023, 2023)
+    assert np.datetime64("2024-11-20") in tesouro_pricing.get_holidays(2024, 2024)
+
+def test_ltn_one_year():
+    # 249 business days in 2023
+    price = tesouro_pricing.price_bonds("LTN", "2024-01-01", 0.10, "2023-01-01")
+    assert price == pytest.approx(1000 / 1.10 ** (249 / 252), abs=1e-6)
+
+def test_unit_price_is_truncated():
+    price = tesouro_pricing.price_bonds("LTN", "2024-01-01", 0.10, "2023-01-01")
+    assert price == np.trunc(1000 / 1.10 ** (249 / 252) * 1e6) / 1e6
+
+def test_ntnf_at_par():
+    # Priced at its own coupon rate, an NTN-F is worth about its face value
+    # (not exactly, as semesters rarely have 126 business days)
+    price = tesouro_pricing.price_bonds("NTN-F", "2035-01-01", 0.10, "2025-01-01")
+    assert price == pytest.approx(1000, rel=0.01)
+
+def test_ntnf_cash_flows():
+    coupon = 100 * (1.10 ** 0.5 - 1)
+    du_coupon = tesouro_pricing.business_days("2024-01-01", "2024-07-01")
+    du_maturity = tesouro_pricing.business_days("2024-01-01", "2025-01-01")
+
+    quote = tesouro_pricing.price_quote("NTN-F", "2025-01-01", 0.12, "2024-01-01")
+    expected = coupon / 1.12 ** (du_coupon / 252) + (100 + coupon) / 1.12 ** (du_maturity / 252)
+
+    assert quote == pytest.approx(expected)
+
+def test_ntnb_uses_vna():
+    coupon = 100 * (1.06 ** 0.5 - 1)
+    du_coupon = tesouro_pricing.business_days("2024-01-02", "2024-05-15")
+    du_maturity = tesouro_pricing.business_days("2024-01-02", "2024-11-15")
+    quote = coupon / 1.065 ** (du_coupon / 252) + (100 + coupon) / 1.065 ** (du_maturity / 252)
+
+    price = tesouro_pricing.price_bonds("NTN-B", "2024-11-15", 0.065, "2024-01-02", vna=4200.0)
+    assert price == pytest.approx(4200.0 * quote / 100, abs=1e-6)
+
+def test_ntnb_principal_one_year():
+    price = tesouro_pricing.price_bonds("NTN-B PRINCIPAL", "2024-01-01", 0.06, "2023-01-01", vna=4000.0)
+    assert price == pytest.approx(4000.0 / 1.06 ** (249 / 252), abs=1e-6)
+
+def test_lft_at_zero_rate_is_worth_the_vna():
+    price = tesouro_pricing.price_bonds("LFT", "2027-03-01", 0.0, "2024-12-04", vna=15500.0)
+    assert price == pytest.approx(15500.0)
+
+def test_lft_alias():
+    ltf = tesouro_pricing.price_bonds("LTF", "2027-03-01", 0.001, "2024-12-04", vna=15500.0)
+    lft = tesouro_pricing.price_bonds("lft", "2027-03-01", 0.001, "2024-12-04", vna=15500.0)
+    assert ltf == lft
+
+def test_implied_vna_round_trip():
+    price = tesouro_pricing.price_bonds("NTN-B", "2035-05-15", 0.068, "2024-12-04", vna=4400.0)
+    vna = tesouro_pricing.implied_vna("NTN-B", "2035-05-15", 0.068, "2024-12-04", price)
+    assert vna == pytest.approx(4400.0, rel=1e-8)
+
+def test_valuation_on_coupon_date_excludes_that_coupon():
+    coupon = 100 * (1.10 ** 0.5 - 1)
+
+    # On the coupon date only the maturity flow is left
+    on_coupon = tesouro_pricing.price_quote("NTN-F", "2025-01-01", 0.10, "2024-07-01")
+    du = tesouro_pricing.business_days("2024-07-01", "2025-01-01")
+    assert on_coupon == pytest.approx((100 + coupon) / 1.10 ** (du / 252))
+
+    # The business day before, the coupon is still discounted by a single day
+    day_before = tesouro_pricing.price_quote("NTN-F", "2025-01-01", 0.10, "2024-06-28")
+    assert day_before > on_coupon + coupon * 0.99
+
+@pytest.mark.parametrize("valuation_date", ["2025-01-01", "2025-06-01"])
+def test_matured_bonds_are_nan(valuation_date):
+    price = tesouro_pricing.price_bonds("LTN", "2025-01-01", 0.10, valuation_date)
+    assert np.isnan(price)
+
+def test_business_day_before_maturity():
+    price = tesouro_pricing.price_bonds("LTN", "2025-01-01", 0.10, "2024-12-31")
+    assert price == pytest.approx(1000 / 1.10 ** (1 / 252), abs=1e-6)
+
+def test_rate_shocks_broadcast():
+    rates = np.array([0.12, 0.13])
+    shocks = np.array([-0.01, 0.0, 0.01])
+
+    bond_codes = np.array(["LTN", "NTN-F"])[:, None]
+    maturity_dates = np.array(["2031-01-01", "2035-01-01"], dtype="datetime64[D]")[:, None]
+
+    prices = tesouro_pricing.price_bonds(bond_codes, maturity_dates, rates[:, None] + shocks, "2024-12-04")
+
+    assert prices.shape == (2, 3)
+    assert (np.diff(prices, axis=1) < 0).all()
+    assert prices[1, 1] == tesouro_pricing.price_bonds("NTN-F", "2035-01-01", 0.13, "2024-12-04")
+
+def test_indexed_bonds_require_vna():
+    with pytest.raises(ValueError):
+        tesouro_pricing.price_bonds("NTN-B", "2035-05-15", 0.068, "2024-12-04")
+
+def test_unknown_bond():
+    with pytest.raises(ValueError):
+        tesouro_pricing.price_bonds("NTN-C", "2031-01-01", 0.06, "2024-12-04")
@@ -1,5 +1,20 @@
+import pandas as pandas
 import yfinance as yf
+import utils.price_matrix as price_matrix
+import utils.result_cache as result_cache
+from utils.result_cache import normalize_date, normalize_text
 
+# Cache TTLs, in seconds
+# The last close TTL is also the Portfolio Tracker's minimum live refresh interval, so live quotes are never older than a tick
+LAST_CLOSE_TTL = 5
+INFO_TTL = 60 * 60
+HISTORY_TTL = 60 * 60
+TICKER_VALIDATION_TTL = 24 * 60 * 60
+
+# Histories in the shared matrix are fetched again daily, picking up dividend and split adjustments
+HISTORY_MATRIX_MAX_AGE = 24 * 60 * 60
+
+@result_cache.cached(ttl=LAST_CLOSE_TTL, normalize={"ticker": normalize_text})
 def get_last_close(ticker: str) -> float | None:
     """Fetches the latest closing price for a given ticker."""
     
@@ -11,6 +26,7 @@ def get_last_close(ticker: str) -> float | None:
         print(f"Error fetching last close for {ticker}: {e}")
         return None
 
+@result_cache.cached(ttl=INFO_TTL, normalize={"ticker": normalize_text})
 def get_short_name(ticker: str) -> str:
     """Fetches the short name of the company or asset."""
     
@@ -23,6 +39,7 @@ def get_short_name(ticker: str) -> str:
         return ""
 
 
+@result_cache.cached(ttl=INFO_TTL, normalize={"ticker": normalize_text})
 def get_info(ticker: str) -> dict:
     """Returns the full .info dictionary for a ticker."""
     
@@ -35,15 +52,52 @@ def get_info(ticker: str) -> dict:
 
 
 def get_historical_prices(ticker: str, start_date, end_date):
-    """Returns historical price data for a given date range."""
+    """
+    Returns historical price data for a given date range. Reads the shared price matrix first.
+    Matrix hits aren't cached per process, so workers don't keep their own copies of the histories. Only downloads are.
+    """
     
+    column = price_matrix.ticker_column(ticker)
+    fields = [
+        price_matrix.read_columns(
+            price_matrix.yfinance_matrix_name(field), [column], start_date, end_date, max_age_seconds=HISTORY_MATRIX_MAX_AGE
+        )
+        for field in price_matrix.YFINANCE_FIELDS
+    ]
+    if all(field is not None for field in fields):
+        # Same frame as yfinance returns: market timezone index, all the history fields and integer volumes
+        hist = pandas.concat(fields, axis=1, keys=price_matrix.YFINANCE_FIELDS).droplevel(1, axis=1)
+        hist = hist.dropna(subset=["Close"])
+        hist["Volume"] = hist["Volume"].fillna(0).astype("int64")
+        return hist
+
+    return download_historical_prices(ticker, start_date, end_date)
+
+@result_cache.cached(ttl=HISTORY_TTL, normalize={"ticker": normalize_text, "start_date": normalize_date, "end_date": normalize_date})
+def download_historical_prices(ticker: str, start_date, end_date):
+    """Downloads historical price data from yfinance, and publishes it to the shared price matrix."""
+
+    column = price_matrix.ticker_column(ticker)
+
     try:
-        return yf.Ticker(ticker).history(start=start_date, end=end_date)
+        hist = yf.Ticker(ticker).history(start=start_date, end=end_date)
+
+        for field in price_matrix.YFINANCE_FIELDS:
+            if field in hist.columns:
+                price_matrix.publish(
+                    price_matrix.yfinance_matrix_name(field), 
+                    hist[[field]].rename(columns={field: column}), 
+                    start_date, 
+                    end_date
+                )
+
+        return hist
     
     except Exception as e:
         print(f"Error fetching historical prices for {ticker}: {e}")
         return None
 
+@result_cache.cached(ttl=TICKER_VALIDATION_TTL, normalize={"ticker": normalize_text})
 def is_valid_yfinance_ticker(ticker):
     """Checks whether a given ticker is valid on yFinance"""
 
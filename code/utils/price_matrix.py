@@ -0,0 +1,317 @@
+"""
+Shared price matrix, stored on local disk and memory-mapped by every Streamlit process.
+
+Each matrix is a date x column float64 NumPy file plus a JSON index header:
+- `<name>.json` holds the dates, the columns, the date range and time each column was downloaded, and the data file name
+- `<name>.<version>.npy` holds the values, mapped read-only so every worker shares the same OS pages
+
+Every process publishes the prices it had to download, so a miss is only fetched once across workers.
+`python -m utils.price_matrix` can prefetch the usual tickers, and PRICE_MATRIX_READ_ONLY=1 turns publishing off.
+Writes are serialized by a thread lock and a lock file, go to a new data file and then the header is atomically
+replaced, so readers never see a partial update. Data files no longer referenced are removed on the next write.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pandas
+
+MATRIX_DIR = os.environ.get(
+    "PRICE_MATRIX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "price_matrix")
+)
+
+# Matrices for the yfinance history fields, named "yfinance_<field>", one column per ticker
+YFINANCE_FIELDS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+
+# Tesouro Direto published fields, one column per "BOND NAME|maturity date"
+TESOURO_MATRICES = {
+    "PU Base Manha": "tesouro_pu_base",
+    "Taxa Venda Manha": "tesouro_taxa_venda",
+    "PU Venda Manha": "tesouro_pu_venda",
+}
+
+# B3 closes at 18:00 (Sao Paulo). Before that, today's bar is still partial and isn't marked as covered
+MARKET_TIMEZONE = "America/Sao_Paulo"
+MARKET_CLOSE_HOUR = 18
+
+# Matrices mapped by this process: name -> (header version, header, frame)
+_mapped = {}
+
+# Serializes the writes of this process. The lock file serializes them across processes.
+_write_lock = threading.Lock()
+LOCK_FILE = ".lock"
+
+def is_writer():
+    """Whether this process is allowed to update the shared matrices."""
+    return os.environ.get("PRICE_MATRIX_READ_ONLY", "0") != "1"
+
+def yfinance_matrix_name(field):
+    return f"yfinance_{field.lower().replace(' ', '_')}"
+
+def ticker_column(ticker):
+    """Builds the matrix column of a ticker, so 'petr4.sa' and 'PETR4.SA' share the same column."""
+    return str(ticker).strip().upper()
+
+def tesouro_column(bond_name, maturity_date):
+    """Builds the matrix column of a bond, in the same format as the portfolio tickers."""
+    return f"{bond_name.upper()}|{pandas.Timestamp(maturity_date).date().isoformat()}"
+
+def header_path(name):
+    return os.path.join(MATRIX_DIR, f"{name}.json")
+
+def last_session_end():
+    """Returns the exclusive end date of the last completed trading session."""
+    now = pandas.Timestamp.now(tz=MARKET_TIMEZONE)
+    today = pandas.Timestamp(now.date())
+    return today + pandas.Timedelta(days=1) if now.hour >= MARKET_CLOSE_HOUR else today
+
+@contextmanager
+def write_lock():
+    """Holds the thread lock and an exclusive lock on the lock file of MATRIX_DIR."""
+    with _write_lock:
+        os.makedirs(MATRIX_DIR, exist_ok=True)
+
+        with open(os.path.join(MATRIX_DIR, LOCK_FILE), "a+b") as lock_file:
+            if os.name == "nt":
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                if os.name == "nt":
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def load_matrix(name):
+    """
+    Maps a matrix read-only and returns (header, frame), or (None, None) if it doesn't exist.
+    The frame is a zero-copy view on the mapped file, so it must not be modified.
+    """
+    path = header_path(name)
+
+    # The header is replaced on every write, so its inode changes even when mtimes collide
+    try:
+        header_stat = os.stat(path)
+    except FileNotFoundError:
+        return None, None
+
+    header_version = (header_stat.st_ino, header_stat.st_mtime_ns, header_stat.st_size)
+
+    cached = _mapped.get(name)
+    if cached is not None and cached[0] == header_version:
+        return cached[1], cached[2]
+
+    try:
+        with open(path, "r") as file:
+            header = json.load(file)
+
+        values = np.load(os.path.join(MATRIX_DIR, header["data_file"]), mmap_mode="r")
+
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f"Error mapping price matrix {name}: {e}")
+        return None, None
+
+    frame = pandas.DataFrame(
+        values,
+        index=pandas.DatetimeIndex(header["dates"], name="Date"),
+        columns=header["columns"],
+        copy=False
+    )
+
+    _mapped[name] = (header_version, header, frame)
+    return header, frame
+
+def read_columns(name, columns, start_date=None, end_date=None, max_age_seconds=None):
+    """
+    Reads columns from a matrix, for dates in [start_date, end_date).
+    Returns None when any column is missing, wasn't downloaded for the whole range or was fetched more than max_age_seconds ago.
+    The index is localized back to the timezone the columns were written with, if any.
+    """
+    header, frame = load_matrix(name)
+    if frame is None:
+        return None
+
+    start = pandas.Timestamp(start_date) if start_date is not None else None
+    end = pandas.Timestamp(end_date) if end_date is not None else None
+
+    for column in columns:
+        coverage = header["coverage"].get(column)
+        if coverage is None:
+            return None
+
+        fetched_at = header.get("fetched_at", {}).get(column, 0)
+        if max_age_seconds is not None and time.time() - fetched_at > max_age_seconds:
+            return None
+
+        covered_start, covered_end = pandas.Timestamp(coverage[0]), pandas.Timestamp(coverage[1])
+        if (start is not None and start < covered_start) or (end is not None and end > covered_end):
+            return None
+
+    rows = slice(None)
+    if start is not None or end is not None:
+        first = frame.index.searchsorted(start) if start is not None else 0
+        last = frame.index.searchsorted(end) if end is not None else len(frame.index)
+        rows = slice(first, last)
+
+    selected = frame.iloc[rows][columns]
+
+    timezones = {header.get("timezones", {}).get(column) for column in columns}
+    if len(timezones) == 1 and None not in timezones:
+        selected.index = selected.index.tz_localize(timezones.pop(), ambiguous=False, nonexistent="shift_forward")
+
+    return selected
+
+def write_columns(name, data, start_date=None, end_date=None):
+    """
+    Merges a date x column frame into a matrix, overriding the existing values of its columns.
+    start_date and end_date record the range the data was downloaded for (defaults to the data's own range).
+    The covered range never goes past the last completed trading session.
+    The timezone of a tz-aware index is recorded, so reads return the same index.
+    Callers should go through publish(), which never raises.
+    """
+    if data.empty:
+        return
+
+    data = data.copy()
+    timezone = str(data.index.tz) if isinstance(data.index, pandas.DatetimeIndex) and data.index.tz is not None else None
+    data.index = pandas.DatetimeIndex(data.index).tz_localize(None).normalize()
+    data = data[~data.index.duplicated(keep="last")].astype(float)
+
+    with write_lock():
+        # Reads the header again under the lock, as another writer may have just replaced it
+        _mapped.pop(name, None)
+        header, current = load_matrix(name)
+        if current is None:
+            header = {"coverage": {}, "fetched_at": {}, "timezones": {}}
+            current = pandas.DataFrame(index=pandas.DatetimeIndex([], name="Date"), dtype=float)
+
+        # Builds the merged matrix, keeping the columns not present in the new data
+        dates = current.index.union(data.index).sort_values()
+        columns = list(current.columns) + [column for column in data.columns if column not in current.columns]
+        merged = current.reindex(index=dates, columns=columns)
+        merged.update(data.reindex(index=dates), overwrite=True)
+
+        coverage = dict(header["coverage"])
+        fetched_at = dict(header.get("fetched_at", {}))
+        timezones = dict(header.get("timezones", {}))
+        for column in data.columns:
+            timezones[column] = timezone
+        session_end = last_session_end()
+
+        for column in data.columns:
+            start = pandas.Timestamp(start_date) if start_date is not None else data.index.min()
+            end = pandas.Timestamp(end_date) if end_date is not None else data.index.max() + pandas.Timedelta(days=1)
+            end = min(end, session_end)
+
+            if end <= start:
+                continue
+
+            # Extends the previous coverage when the ranges overlap
+            if column in coverage:
+                previous_start, previous_end = pandas.Timestamp(coverage[column][0]), pandas.Timestamp(coverage[column][1])
+                if start <= previous_end and end >= previous_start:
+                    start, end = min(start, previous_start), max(end, previous_end)
+
+            coverage[column] = [start.date().isoformat(), end.date().isoformat()]
+            fetched_at[column] = time.time()
+
+        # Writes the data file first, then swaps the header so readers switch atomically
+        data_file = f"{name}.{uuid.uuid4().hex}.npy"
+        values = np.lib.format.open_memmap(
+            os.path.join(MATRIX_DIR, data_file), mode="w+", dtype=np.float64, shape=merged.shape
+        )
+        values[:] = merged.to_numpy(dtype=np.float64)
+        values.flush()
+        del values
+
+        new_header = {
+            "data_file": data_file,
+            "dates": [day.date().isoformat() for day in dates],
+            "columns": columns,
+            "coverage": coverage,
+            "fetched_at": fetched_at,
+            "timezones": timezones,
+        }
+
+        temp_path = f"{header_path(name)}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(new_header, file)
+        os.replace(temp_path, header_path(name))
+
+        remove_unreferenced_files(name, data_file)
+
+def remove_unreferenced_files(name, data_file):
+    """
+    Removes the data files and temporary headers of a matrix, other than its current data file. Must hold the write lock.
+    Workers still mapping a removed file keep their pages until they remap. On Windows mapped files can't be removed,
+    so they're left for a later write.
+    """
+    pattern = re.compile(rf"^{re.escape(name)}\.([0-9a-f]{{32}}\.npy|json\.[0-9a-f]{{32}}\.tmp)$")
+
+    for file_name in os.listdir(MATRIX_DIR):
+        if file_name == data_file or not pattern.match(file_name):
+            continue
+
+        try:
+            os.remove(os.path.join(MATRIX_DIR, file_name))
+        except OSError as e:
+            print(f"Could not remove old price matrix file {file_name}: {e}")
+
+def publish(name, data, start_date=None, end_date=None):
+    """
+    Writes freshly fetched data to a matrix, unless the matrices are read-only for this process.
+    Failures are only logged, so they never discard the data the caller already fetched.
+    """
+    if not is_writer():
+        return
+
+    try:
+        write_columns(name, data, start_date, end_date)
+    except Exception as e:
+        print(f"Error writing price matrix {name}: {e}")
+
+def refresh(tickers, start_date, end_date):
+    """Downloads the history of the tickers and the Tesouro Direto prices into the shared matrices."""
+    import yfinance as yf
+    import utils.tesouro_direto as tesouro_direto
+
+    for ticker in tickers:
+        try:
+            hist = yf.Ticker(ticker).history(start=start_date, end=end_date)
+        except Exception as e:
+            print(f"Error fetching historical prices for {ticker}: {e}")
+            continue
+
+        for field in YFINANCE_FIELDS:
+            if field in hist.columns:
+                publish(yfinance_matrix_name(field), hist[[field]].rename(columns={field: ticker_column(ticker)}), start_date, end_date)
+
+    bonds = tesouro_direto.get_bonds(type="taxa", group=False)
+    for field, matrix_name in TESOURO_MATRICES.items():
+        series = bonds.pivot_table(index="Data Base", columns=["Tipo Titulo", "Data Vencimento"], values=field)
+        series.columns = [tesouro_column(bond_name, maturity_date) for bond_name, maturity_date in series.columns]
+        publish(matrix_name, series)
+
+if __name__ == "__main__":
+    # Prefetch entry point, e.g. scheduled daily: python -m utils.price_matrix (from the code/ folder)
+    from datetime import date, timedelta
+
+    tickers_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "ibov_tickers.csv")
+    tickers = pandas.read_csv(tickers_path)["ticker"].tolist()
+
+    # The covered range is clamped to the last completed session, so today's partial bar isn't served as final
+    today = date.today()
+    refresh(tickers, today - timedelta(days=5 * 365), today + timedelta(days=1))
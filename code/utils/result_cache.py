@@ -0,0 +1,158 @@
+"""
+Process-wide result cache for the data functions.
+
+Streamlit reruns the whole script on every interaction, but modules are imported once per process,
+so the entries stored here are shared by every session and every rerun.
+- Keys are built from the normalized arguments (e.g. "petr4.sa" and "PETR4.SA" hit the same entry)
+- Each function has its own TTL
+- The total size is bounded in bytes, evicting the least recently used entries first
+- Entries can be invalidated explicitly, e.g. when a new operation is saved
+
+Usage:
+    @result_cache.cached(ttl=60, normalize={"ticker": result_cache.normalize_text})
+    def get_last_close(ticker): ...
+"""
+
+import os
+import sys
+import time
+import inspect
+import threading
+import functools
+import numpy as np
+import pandas as pandas
+from collections import OrderedDict
+
+MAX_CACHE_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Key -> (expires_at, size, value), ordered from least to most recently used
+_entries = OrderedDict()
+_total_bytes = 0
+_lock = threading.Lock()
+
+def normalize_text(value):
+    """Normalizes tickers and bond names: 'petr4.sa ' -> 'PETR4.SA'."""
+    return str(value).strip().upper()
+
+def normalize_date(value):
+    """Normalizes dates given as strings, date, datetime or Timestamp to 'YYYY-MM-DD'."""
+    return pandas.Timestamp(value).date().isoformat() if value is not None else None
+
+def estimate_size(value):
+    """Estimates the memory used by a cached value, in bytes."""
+    if isinstance(value, pandas.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pandas.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+def copy_value(value):
+    """Copies mutable results, so callers can't modify the cached entry."""
+    if isinstance(value, (pandas.DataFrame, pandas.Series, np.ndarray)):
+        return value.copy()
+    if isinstance(value, (dict, list)):
+        return value.copy()
+    return value
+
+def _evict(max_bytes):
+    """Drops the least recently used entries until the cache fits in max_bytes. Must hold the lock."""
+    global _total_bytes
+    while _entries and _total_bytes > max_bytes:
+        _, (_, size, _) = _entries.popitem(last=False)
+        _total_bytes -= size
+
+def _get(key):
+    global _total_bytes
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, size, value = entry
+        if time.monotonic() >= expires_at:
+            del _entries[key]
+            _total_bytes -= size
+            return False, None
+
+        _entries.move_to_end(key)
+        return True, value
+
+def _put(key, value, ttl):
+    global _total_bytes
+    size = estimate_size(value)
+
+    # Values larger than the whole cache are never stored
+    if size > MAX_CACHE_BYTES:
+        return
+
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _total_bytes -= previous[1]
+
+        _entries[key] = (time.monotonic() + ttl, size, value)
+        _total_bytes += size
+        _evict(MAX_CACHE_BYTES)
+
+def invalidate(*functions):
+    """Drops the entries of the given cached functions, or every entry when called without arguments."""
+    global _total_bytes
+    names = {function.cache_name for function in functions}
+
+    with _lock:
+        for key in list(_entries):
+            if not names or key[0] in names:
+                _total_bytes -= _entries.pop(key)[1]
+
+def stats():
+    """Returns the number of entries and the bytes currently cached."""
+    with _lock:
+        return {"entries": len(_entries), "bytes": _total_bytes, "max_bytes": MAX_CACHE_BYTES}
+
+def cached(ttl, normalize=None):
+    """
+    Caches a function's results for ttl seconds.
+    `normalize` maps argument names to functions applied to them when building the key.
+    Calls whose arguments aren't hashable, results that are None and exceptions are never cached.
+    """
+    normalize = normalize or {}
+
+    def decorator(function):
+        signature = inspect.signature(function)
+        cache_name = f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+
+            key = (cache_name,) + tuple(
+                (name, normalize[name](value) if name in normalize else value)
+                for name, value in bound.arguments.items()
+            )
+
+            try:
+                hit, value = _get(key)
+            except TypeError:
+                # Unhashable arguments, e.g. DataFrames
+                return function(*args, **kwargs)
+
+            if not hit:
+                value = function(*args, **kwargs)
+                if value is None:
+                    return None
+                _put(key, value, ttl)
+
+            return copy_value(value)
+
+        wrapper.cache_name = cache_name
+        wrapper.invalidate = lambda: invalidate(wrapper)
+        return wrapper
+
+    return decorator
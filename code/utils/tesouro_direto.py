@@ -1,6 +1,12 @@
+import numpy as np
 import pandas as pd
 import requests
 import io
+from datetime import date
+import utils.price_matrix as price_matrix
+import utils.result_cache as result_cache
+from utils.result_cache import normalize_date, normalize_text
+import utils.tesouro_pricing as tesouro_pricing
 
 # TESOURO_BONDS = {
 #     "Tesouro IPCA+ com Juros Semestrais": "NTN-B",
@@ -24,6 +30,24 @@ TESOURO_BONDS = {
     "TESOURO EDUCA+": "EDUCA+",
 }
 
+# Tesouro publishes new prices once a day
+TESOURO_MATRIX_MAX_AGE = 24 * 60 * 60
+
+# Cache TTL, in seconds. The published tables are refreshed at most a few times a day
+TESOURO_TTL = 60 * 60
+
+def normalize_valuation_date(value):
+    """Resolves the default valuation date (today) before keying, so a value cached yesterday isn't served today."""
+    return normalize_date(value if value is not None else date.today())
+
+# Bonds are identified by name and maturity, whatever the case and date format used
+BOND_NORMALIZERS = {
+    "bond_name": normalize_text,
+    "maturity_date": normalize_date,
+    "investment_date": normalize_date,
+    "valuation_date": normalize_valuation_date,
+}
+
 def parse_date_columns(dataframe):
     """Convert date columns (starting with 'Data' or 'Vencimento') to datetime."""
     for col in dataframe.columns:
@@ -31,6 +55,7 @@ def parse_date_columns(dataframe):
             dataframe[col] = pd.to_datetime(dataframe[col], format="%d/%m/%Y")
     return dataframe
 
+@result_cache.cached(ttl=TESOURO_TTL, normalize={"type": lambda value: str(value).lower()})
 def get_bonds(type = "venda", group = True):
     if type.lower() == "venda":
         url = "https://www.tesourotransparente.gov.br/ckan/dataset/f0468ecc-ae97-4287-89c2-6d8139fb4343/resource/e5f90e3a-8f8d-4895-9c56-4bb2f7877920/download/VendasTesouroDireto.csv"
@@ -63,38 +88,174 @@ def get_bonds(type = "venda", group = True):
 
     return dataframe
 
-def get_bond_returns(bond_name, maturity_date, investment_date, investment_amount):
+def select_bond(bonds, bond_name, maturity_date):
+    """
+    Selects the rows of a bond from the grouped table.
+    Names are matched case-insensitively, as the CSV mixes cases (e.g. "Tesouro IPCA+ com Juros Semestrais").
+    """
+    names = bonds.index.get_level_values(0).str.upper()
+    maturities = bonds.index.get_level_values(1)
+    bond = bonds[(names == bond_name.upper()) & (maturities == pd.Timestamp(maturity_date))]
+
+    if bond.empty:
+        raise KeyError(f"Bond not found: {bond_name} {maturity_date}")
+    return bond
+
+def get_bond_series(bond_name, maturity_date):
+    """
+    Returns the published series of a bond (PU Base Manha, Taxa Venda Manha and PU Venda Manha), reading the shared price matrix first.
+    Matrix hits aren't cached per process, as the matrix is already shared. Only the fallback download is.
+    """
+    column = price_matrix.tesouro_column(bond_name, maturity_date)
+
+    fields = [
+        price_matrix.read_columns(matrix_name, [column], max_age_seconds=TESOURO_MATRIX_MAX_AGE)
+        for matrix_name in price_matrix.TESOURO_MATRICES.values()
+    ]
+    if all(field is not None for field in fields):
+        series = pd.concat(fields, axis=1)
+        series.columns = list(price_matrix.TESOURO_MATRICES)
+        series.index.name = "Data Base"
+        return series.dropna(how="all")
+
+    return download_bond_series(bond_name, maturity_date)
+
+@result_cache.cached(ttl=TESOURO_TTL, normalize=BOND_NORMALIZERS)
+def download_bond_series(bond_name, maturity_date):
+    """Builds the published series of a bond from the downloaded table, and publishes them to the shared matrix."""
+    column = price_matrix.tesouro_column(bond_name, maturity_date)
+
     #Gets the bonds data
     bonds = get_bonds(type="taxa", group=True)
 
     # Retrieve the appropriate bond
-    # Why .title() - because the CSV has the data not fully upper or lowercase e.g. Tesouro Prefixado 
-    # and title() matches that format
-    bond = bonds.loc[(bond_name.title(), maturity_date)]
+    bond = select_bond(bonds, bond_name, maturity_date)
 
-    # Builds a time series with Preco Unitario 
+    # Builds the time series
     # Sorts by date
     # Sets the date as index
-    price_series = bond.sort_values("Data Base").set_index("Data Base")[["PU Base Manha"]]
+    series = bond.sort_values("Data Base").set_index("Data Base")[list(price_matrix.TESOURO_MATRICES)]
+
+    for field, matrix_name in price_matrix.TESOURO_MATRICES.items():
+        price_matrix.publish(matrix_name, series[[field]].rename(columns={field: column}))
+
+    return series
+
+def get_bond_price_series(bond_name, maturity_date):
+    """Returns the PU Base Manha series of a bond."""
+    return get_bond_series(bond_name, maturity_date)[["PU Base Manha"]].dropna()
+
+@result_cache.cached(ttl=TESOURO_TTL, normalize=BOND_NORMALIZERS)
+def get_bond_returns(bond_name, maturity_date, investment_date, investment_amount):
+    price_series = get_bond_price_series(bond_name, maturity_date)
 
     # Naming the column
-    price_series.columns = ["Cumulative Returns"]
+    price_series = price_series.rename(columns={"PU Base Manha": "Cumulative Returns"})
 
     # Filters for dates starting from the investment date
     price_series_from_investment_date = price_series[price_series.index >= pd.to_datetime(investment_date)]
-    
-    # Calculates daily returns
-    daily_pct_returns = price_series_from_investment_date.pct_change()
 
-    # Fills the first NaN with the investment_ammount
-    # Then applies compount returns
-    cumulative_returns = (1 + daily_pct_returns.fillna(investment_amount)).cumprod() - 1
+    # Bought after the last publication, nothing to scale yet
+    if price_series_from_investment_date.empty:
+        return price_series_from_investment_date
+
+    # Scales the investment by the unit price evolution since the investment date
+    cumulative_returns = investment_amount * price_series_from_investment_date / price_series_from_investment_date.iloc[0]
 
     return cumulative_returns
 
-def get_last_price(bond_name, maturity_date, investment_date, quantity, investment_amount):
+def get_bond_prices(bond_names, maturity_dates, valuation_dates, rate_shocks=0.0, bonds=None):
+    """
+    Prices bonds on any date from the published rates, without needing the date in the PU table.
+    Each bond uses the last rate published on or before its valuation date, plus an optional rate shock (as a decimal).
+    Indexed bonds carry the VNA implied by that same publication, accrued to the valuation date (see below).
+    All arguments are broadcast, so a whole portfolio can be revalued under several shocks in a single call.
+    `bonds` is an optional grouped price table (get_bonds); by default each bond's series is read from the shared matrix.
+    """
+
+    bond_names, maturity_dates, valuation_dates = np.broadcast_arrays(
+        np.asarray(bond_names, dtype=str),
+        np.asarray(maturity_dates, dtype="datetime64[D]"),
+        np.asarray(valuation_dates, dtype="datetime64[D]"),
+    )
+
+    bond_codes = np.empty(bond_names.shape, dtype=object)
+    rates = np.full(bond_names.shape, np.nan)
+    vna = np.full(bond_names.shape, np.nan)
+
+    # Looks up the last publication of each bond before the valuation dates
+    for bond_name, maturity_date in set(zip(bond_names.ravel(), maturity_dates.ravel())):
+        selected = (bond_names == bond_name) & (maturity_dates == maturity_date)
+        bond_code = TESOURO_BONDS[bond_name.upper()]
+        bond_codes[selected] = bond_code
+
+        if bonds is not None:
+            published = select_bond(bonds, bond_name, maturity_date).set_index("Data Base")
+        else:
+            published = get_bond_series(bond_name, maturity_date)
+        published = published.sort_index()
+
+        # Values from the sell side, what a holder redeems at. Bonds no longer offered have blank or zero buy fields
+        # Zero rates are only skipped for bonds other than LFT, which trades around 0%
+        valid = (published["PU Venda Manha"] > 0) & published["Taxa Venda Manha"].notna()
+        if tesouro_pricing.normalize_bond_codes(bond_code).item() != "LFT":
+            valid &= published["Taxa Venda Manha"] != 0
+        published = published[valid]
+
+        published_dates = published.index.values.astype("datetime64[D]")
+        published_rates = published["Taxa Venda Manha"].values / 100
+
+        published_vna = tesouro_pricing.implied_vna(
+            bond_code, maturity_date, published_rates, published_dates, published["PU Venda Manha"].values
+        )
+
+        position = np.searchsorted(published_dates, valuation_dates[selected], side="right") - 1
+        has_rate = position >= 0
+        if published_dates.size == 0:
+            continue
+
+        # Indexed bonds accrue their VNA every business day (Selic for LFT, IPCA pro rata for NTN-B).
+        # After a publication, the VNA is projected at the daily factor implied by that publication and the previous one
+        position = np.maximum(position, 0)
+        previous = np.maximum(position - 1, 0)
+        du_published = tesouro_pricing.business_days(published_dates[previous], published_dates[position])
+        daily_factor = np.where(
+            du_published > 0,
+            (published_vna[position] / published_vna[previous]) ** (1 / np.maximum(du_published, 1)),
+            1.0
+        )
+        du_since_published = tesouro_pricing.business_days(published_dates[position], valuation_dates[selected])
+        projected_vna = published_vna[position] * daily_factor ** du_since_published
+
+        rates[selected] = np.where(has_rate, published_rates[position], np.nan)
+        vna[selected] = np.where(has_rate, projected_vna, np.nan)
+
+    return tesouro_pricing.price_bonds(bond_codes.astype(str), maturity_dates, rates + rate_shocks, valuation_dates, vna=vna)
+
+@result_cache.cached(ttl=TESOURO_TTL, normalize=BOND_NORMALIZERS)
+def get_last_price(bond_name, maturity_date, investment_date, quantity, investment_amount, valuation_date=None):
     bond_returns = get_bond_returns(bond_name, maturity_date, investment_date, investment_amount)
-    bond_current_value = bond_returns.iloc[-1,0]
+    valuation_date = pd.Timestamp(valuation_date if valuation_date is not None else date.today()).normalize()
+
+    if bond_returns.empty:
+        # Bought after the last publication (today, on a weekend or a holiday): starts from the amount invested
+        base_date = pd.Timestamp(investment_date).normalize()
+        bond_current_value = investment_amount
+    else:
+        base_date = bond_returns.index[-1]
+        bond_current_value = bond_returns.iloc[-1,0]
+
+    # Dates after the last publication (weekends, holidays, today before the table is updated)
+    # are valued from the published rates, scaling the base value by the theoretical price change
+    if valuation_date > base_date:
+        try:
+            base_price, current_price = get_bond_prices(bond_name, maturity_date, [base_date, valuation_date])
+            if base_price > 0 and np.isfinite(current_price):
+                bond_current_value *= current_price / base_price
+
+        except (KeyError, ValueError) as e:
+            print(f"Error pricing {bond_name} {maturity_date} on {valuation_date.date()}: {e}")
+
     print(f"A: {bond_current_value}")
     return bond_current_value / quantity
 
@@ -0,0 +1,179 @@
+"""
+Pricing engine for Tesouro Direto bonds.
+
+Computes the unit price (PU) of LTN, NTN-F, NTN-B, NTN-B Principal and LFT from their yearly rates,
+following the Tesouro Nacional / ANBIMA conventions:
+- Business days (du) counted on the B3 national holiday calendar, on a 252 days basis
+- Semiannual coupons paid backwards from the maturity date (NTN-F and NTN-B)
+- Indexed bonds (NTN-B, NTN-B Principal and LFT) are priced as a quote over the VNA (Valor Nominal Atualizado)
+
+Everything is vectorized with NumPy, so many bonds, dates and rate scenarios are priced in a single call.
+"""
+
+import numpy as np
+from functools import lru_cache
+
+FACE_VALUE = 1000.0
+BUSINESS_DAYS_PER_YEAR = 252
+PU_DECIMALS = 6
+
+# Bond code -> (yearly coupon rate, is indexed to a VNA)
+BOND_TERMS = {
+    "LTN": (0.0, False),
+    "NTN-F": (0.10, False),
+    "NTN-B": (0.06, True),
+    "NTN-B PRINCIPAL": (0.0, True),
+    "LFT": (0.0, True),
+}
+
+# tesouro_direto.TESOURO_BONDS lists Tesouro Selic as "LTF"
+BOND_CODE_ALIASES = {"LTF": "LFT"}
+
+# Fixed date national holidays observed by B3, as (month, day)
+FIXED_HOLIDAYS = [(1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (12, 25)]
+
+# Easter based holidays as day offsets: Carnival Monday and Tuesday, Good Friday, Corpus Christi
+EASTER_HOLIDAY_OFFSETS = [-48, -47, -2, 60]
+
+# Dia da Consciência Negra became a national holiday in 2024
+BLACK_CONSCIOUSNESS_DAY_FIRST_YEAR = 2024
+
+def easter_date(year):
+    """Returns the Easter Sunday of a year (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return np.datetime64(f"{year:04d}-{month:02d}-{day + 1:02d}", "D")
+
+@lru_cache(maxsize=None)
+def get_holidays(first_year, last_year):
+    """Returns the B3 national holidays between two years (inclusive) as a datetime64[D] array."""
+    holidays = []
+    for year in range(first_year, last_year + 1):
+        holidays += [np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", "D") for month, day in FIXED_HOLIDAYS]
+
+        easter = easter_date(year)
+        holidays += [easter + np.timedelta64(offset, "D") for offset in EASTER_HOLIDAY_OFFSETS]
+
+        if year >= BLACK_CONSCIOUSNESS_DAY_FIRST_YEAR:
+            holidays.append(np.datetime64(f"{year:04d}-11-20", "D"))
+
+    holidays = np.unique(np.array(holidays, dtype="datetime64[D]"))
+    holidays.flags.writeable = False
+    return holidays
+
+def business_days(start_dates, end_dates):
+    """
+    Counts the business days in [start, end) on the B3 calendar.
+    Payments falling on a holiday or weekend are settled on the next business day, which yields the same count.
+    """
+    start_dates = np.asarray(start_dates, dtype="datetime64[D]")
+    end_dates = np.asarray(end_dates, dtype="datetime64[D]")
+
+    all_dates = np.concatenate([start_dates.ravel(), end_dates.ravel()])
+    if all_dates.size == 0:
+        return np.zeros(np.broadcast(start_dates, end_dates).shape, dtype=int)
+
+    years = all_dates.astype("datetime64[Y]").astype(int) + 1970
+    holidays = get_holidays(int(years.min()), int(years.max()))
+
+    return np.busday_count(start_dates, end_dates, holidays=holidays)
+
+def normalize_bond_codes(bond_codes):
+    """Upper-cases bond codes and resolves aliases. Raises ValueError for bonds the engine can't price."""
+    codes = np.char.upper(np.char.strip(np.asarray(bond_codes, dtype=str)))
+
+    for alias, code in BOND_CODE_ALIASES.items():
+        codes = np.where(codes == alias, code, codes)
+
+    unknown = set(np.unique(codes)) - set(BOND_TERMS)
+    if unknown:
+        raise ValueError(f"Bond type not supported: {', '.join(sorted(unknown))}")
+    return codes
+
+def coupon_schedule(maturity_dates, valuation_dates):
+    """
+    Builds the cash flow dates of each bond, walking back from maturity in 6 month steps.
+    Returns the dates with an extra trailing axis (index 0 is the maturity) and a mask of the flows still to be paid.
+    """
+    maturity_dates = np.asarray(maturity_dates, dtype="datetime64[D]")
+    valuation_dates = np.asarray(valuation_dates, dtype="datetime64[D]")
+
+    maturity_months = maturity_dates.astype("datetime64[M]")
+    day_offset = maturity_dates - maturity_months.astype("datetime64[D]")
+
+    # Number of semesters needed to cover the longest bond
+    months_to_maturity = (maturity_months - valuation_dates.astype("datetime64[M]")).astype(int)
+    num_flows = max(int(months_to_maturity.max(initial=0)) // 6 + 1, 1)
+    steps = np.arange(num_flows) * 6
+
+    flow_months = maturity_months[..., None] - steps.astype("timedelta64[M]")
+    flow_dates = flow_months.astype("datetime64[D]") + day_offset[..., None]
+    pending = flow_dates > valuation_dates[..., None]
+
+    return flow_dates, pending
+
+def price_quote(bond_codes, maturity_dates, rates, valuation_dates):
+    """
+    Computes the price as a percentage of the face value (or of the VNA, for indexed bonds).
+    All arguments are broadcast against each other. Rates are yearly, as decimals (e.g. 0.1234 for 12.34%).
+    Bonds already matured on the valuation date return NaN.
+    """
+    codes, maturity_dates, rates, valuation_dates = np.broadcast_arrays(
+        normalize_bond_codes(bond_codes),
+        np.asarray(maturity_dates, dtype="datetime64[D]"),
+        np.asarray(rates, dtype=float),
+        np.asarray(valuation_dates, dtype="datetime64[D]"),
+    )
+
+    coupon_rates = np.vectorize(lambda code: BOND_TERMS[code][0], otypes=[float])(codes)
+    semiannual_coupons = 100 * ((1 + coupon_rates) ** 0.5 - 1)
+
+    flow_dates, pending = coupon_schedule(maturity_dates, valuation_dates)
+    du = business_days(valuation_dates[..., None], flow_dates)
+
+    # Coupons on every pending flow, face value on the maturity one
+    cash_flows = np.where(pending, semiannual_coupons[..., None], 0.0)
+    cash_flows[..., 0] += np.where(pending[..., 0], 100.0, 0.0)
+
+    discount = (1 + rates[..., None]) ** (du / BUSINESS_DAYS_PER_YEAR)
+    quote = (cash_flows / discount).sum(axis=-1)
+
+    return np.where(pending[..., 0], quote, np.nan)
+
+def price_bonds(bond_codes, maturity_dates, rates, valuation_dates, vna=None):
+    """
+    Computes the unit price (PU) of bonds from their yearly rates (as decimals).
+    All arguments are broadcast, e.g. rates[:, None] + shocks[None, :] revalues every bond under every shock at once.
+    `vna` is required when pricing NTN-B, NTN-B Principal or LFT. It is ignored for the prefixed bonds.
+    """
+    codes = normalize_bond_codes(bond_codes)
+    quote = price_quote(codes, maturity_dates, rates, valuation_dates)
+
+    indexed = np.vectorize(lambda code: BOND_TERMS[code][1], otypes=[bool])(codes)
+    if vna is None:
+        if indexed.any():
+            raise ValueError("VNA is required to price indexed bonds (NTN-B, NTN-B Principal, LFT).")
+        vna = np.nan
+
+    base_value = np.where(indexed, np.asarray(vna, dtype=float), FACE_VALUE)
+    unit_price = base_value * quote / 100
+
+    # ANBIMA truncates the unit price instead of rounding it
+    scale = 10 ** PU_DECIMALS
+    return np.trunc(unit_price * scale) / scale
+
+def implied_vna(bond_codes, maturity_dates, rates, valuation_dates, unit_prices):
+    """
+    Backs out the VNA embedded in published unit prices and rates.
+    Useful to reuse the last published VNA when pricing indexed bonds on dates outside the published table.
+    """
+    quote = price_quote(bond_codes, maturity_dates, rates, valuation_dates)
+    return np.asarray(unit_prices, dtype=float) / quote * 100